@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Rough timings of catalogue lookups for hit-heavy and miss-heavy
+workloads. Run with ``python bench_mimecat.py``.
+"""
+import timeit
+
+from mimecat import Catalogue, SQLiteCatalogue
+
+NUMBER_OF_TYPES = 2000
+NUMBER_OF_LOOKUPS = 100000
+
+def _populate(cat):
+    """Adds ``NUMBER_OF_TYPES`` synthetic types to ``cat``
+    """
+    for i in range(NUMBER_OF_TYPES):
+        cat.add_type("application/x-bench%d" % i,
+                     ["b%d" % i, ".bb%d" % i])
+
+def _workload(hit_ratio):
+    """Returns a list of extensions where roughly ``hit_ratio`` of them are
+    known.
+    """
+    extensions = []
+    for i in range(NUMBER_OF_LOOKUPS):
+        if (i % 100) < hit_ratio * 100:
+            extensions.append("b%d" % (i % NUMBER_OF_TYPES))
+        else:
+            extensions.append("miss%d" % (i % 50))
+    return extensions
+
+def _get_types(cat, extensions):
+    """Looks up ``extensions`` with the raising ``get_types``
+    """
+    for ext in extensions:
+        try:
+            cat.get_types(ext)
+        except KeyError:
+            pass
+
+def _lookup_types(cat, extensions):
+    """Looks up ``extensions`` with the non-raising ``lookup_types``
+    """
+    for ext in extensions:
+        cat.lookup_types(ext)
+
+def main():
+    """Prints timings for each catalogue, workload and lookup method.
+    """
+    catalogue = Catalogue.empty()
+    _populate(catalogue)
+    sqlite_catalogue = SQLiteCatalogue(":memory:")
+    _populate(sqlite_catalogue)
+
+    for (name, cat) in (("Catalogue", catalogue),
+                        ("SQLiteCatalogue", sqlite_catalogue)):
+        for (workload, hit_ratio) in (("hit-heavy", 0.9),
+                                      ("miss-heavy", 0.1)):
+            extensions = _workload(hit_ratio)
+            for method in (_get_types, _lookup_types):
+                elapsed = min(timeit.repeat(lambda: method(cat, extensions),
+                                            number = 1, repeat = 3))
+                print("%-16s %-11s %-14s %.4fs" % (name, workload,
+                                                   method.__name__[1:],
+                                                   elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,41 @@
 """mimecat - Easy catalogue of MIME types and extensions.
 """
 
+# The catalogues and their sequential, concurrent and asyncio loaders share
+# the private parsing and file opening helpers below. Splitting them into
+# modules would make those imports circular.
+# pylint: disable=C0302
+
+import bz2
+import codecs
+import gzip
+import io
+import json
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer
+
+from mimecat_report import (deep_sizeof, distribution, format_report,
+                            structure_sizes)
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    _STRING_TYPES = (str, unicode)
+except NameError:
+    _STRING_TYPES = (str,)
+
 #
 # taken from mimetypes.py
 #
@@ -17,6 +52,16 @@ _KNOWNFILES = [
     "/usr/local/etc/mime.types",                # Apache 1.3
     ]
 
+# Number of lines read and parsed per executor call when loading
+# asynchronously.
+_CHUNK_LINES = 1000
+
+# Number of bytes read from compressed sources at a time.
+_READ_SIZE = 65536
+
+# Marks a lookup recorded in a negative cache.
+_MISS = object()
+
 class Catalogue(object):
     """A Catalogue object represents a list of known MIME types and
     extensions. It can be initialized with a given filename or list of
@@ -61,19 +106,43 @@ class Catalogue(object):
         self._known_mediatypes = None
         self._known_mimetypes = None
         self._known_extensions = None
+        self._spellings_to_types = None
+        self._load_profile = None
 
         self.clear()
 
         if filenames is None and filep is None:
             self.load_filenames(_KNOWNFILES, True)
         else:
-            if filep is not None:
-                self.load_file(filep)
+            self._load_sources(filenames, filep)
+
+    def _load_sources(self, filenames, filep):
+        """Loads ``filep`` followed by ``filenames``, skipping whichever of
+        the two is None.
 
-            if filenames is not None:
-                if isinstance(filenames, (str, unicode)):
-                    filenames = [filenames]
-                self.load_filenames(filenames)
+        :param filenames: a filename or a list of filenames
+        :param filep: a file-like object to read definitions from.
+
+        :raises: IOError If unable to find any of the files.
+        """
+        if filep is not None:
+            self.load_file(filep)
+
+        if filenames is not None:
+            if isinstance(filenames, _STRING_TYPES):
+                filenames = [filenames]
+            self.load_filenames(filenames)
+
+    @classmethod
+    def empty(cls):
+        """Returns a catalogue with no MIME types, without searching for or
+        loading any ``mime.types`` file.
+
+        :returns: An empty catalogue.
+        """
+        cat = cls.__new__(cls)
+        cat.clear()
+        return cat
 
     def clear(self):
         """Clears out catalogue of known types.
@@ -83,47 +152,292 @@ class Catalogue(object):
         self._known_mediatypes = set()
         self._known_mimetypes = set()
         self._known_extensions = set()
+        self._spellings_to_types = {}
+        self._load_profile = []
 
-    def load_filenames(self, filenames, stop_on_successful_load = False):
+    def load_filenames(self, filenames, stop_on_successful_load = False,
+                       max_workers = None):
         """Loads in MIME type defitions from ``filenames`` If
         ``stop_on_successful_load`` is True, then will stop on the first
         successful loading, else it will load all the files listed.
 
+        If ``max_workers`` is given and ``stop_on_successful_load`` is False,
+        then the files are read and parsed concurrently by up to
+        ``max_workers`` threads. The parsed definitions are still added in
+        the order the files are listed, so the result is the same as a
+        sequential load.
+
         :param filenames: List of files that could potentially contain
           MIME type defitions.
 
         :param stop_on_successful_load: If False, then load all the files.
 
+        :param max_workers: Number of threads used to read the files. If
+          None, files are read one after another.
+
         :raises: IOError If None of the listed files can be loaded.
 
         """
-        successful_load = False
-        for filename in filenames:
-            try:
-                self.load_filename(filename)
-                successful_load = True
-                if stop_on_successful_load:
-                    break
-            except IOError:
-                pass
+        if max_workers and not stop_on_successful_load:
+            successful_load = self._load_filenames_concurrently(filenames,
+                                                                max_workers)
+        else:
+            successful_load = False
+            for filename in filenames:
+                try:
+                    self.load_filename(filename)
+                    successful_load = True
+                    if stop_on_successful_load:
+                        break
+                except IOError:
+                    pass
 
         if not successful_load:
             raise IOError("Could not locate a suitable mime.types file.")
 
+    def _load_filenames_concurrently(self, filenames, max_workers):
+        """Reads and parses ``filenames`` in a thread pool, then adds the
+        results in list order. A file which fails to read or parse has the
+        lines before the failure added and its exception re-raised in turn,
+        exactly as ``load_filename`` would.
+
+        :returns: True if at least one of the files was loaded.
+        """
+        filenames = list(filenames)
+        if not filenames:
+            return False
+
+        pool = ThreadPool(min(max_workers, len(filenames)))
+        try:
+            parsed_files = pool.map(_read_filename, filenames)
+        finally:
+            pool.close()
+            pool.join()
+
+        successful_load = False
+        for (filename, (records, parse_seconds, error)) in zip(filenames,
+                                                               parsed_files):
+            start = default_timer()
+            try:
+                with self._loading():
+                    count = self._add_records(records)
+                    if error is not None:
+                        raise error
+            except IOError:
+                continue
+            self._record_load(filename,
+                              parse_seconds + default_timer() - start, count)
+            successful_load = True
+        return successful_load
+
     def load_filename(self, filename):
         """Loads in MIME type definitions from ``filename``.
 
+        If ``filename`` ends in ``.gz``, ``.bz2`` or ``.xz``, then it is
+        decompressed as it is read and fed to a ``CatalogueParser``, so it
+        is never decompressed in full. As with uncompressed files, a
+        ``SQLiteCatalogue`` adds the whole file in a single transaction.
+
         :param filename: The filename to load into the class
         """
-        with open(filename, "r") as filep:
-            self.load_file(filep)
+        if _compression(filename) is None:
+            with open(filename, "r") as filep:
+                self.load_file(filep)
+            return
+
+        start = default_timer()
+        parser = CatalogueParser(self)
+        with self._loading():
+            with _open_compressed(filename, False) as filep:
+                for block in iter(lambda: filep.read(_READ_SIZE), b""):
+                    parser.feed(block)
+            count = parser.close()
+        self._record_load(filename, default_timer() - start, count)
 
     def load_file(self, filep):
         """Loads in MIME type definitions from open ``filep``
         :param filep: The file to load into the class
         """
-        for (mime_type, extensions) in _parse_file(filep):
+        start = default_timer()
+        with self._loading():
+            count = self._add_records(_parse_file(filep))
+        self._record_load(getattr(filep, "name", "<file>"),
+                          default_timer() - start, count)
+
+    def _add_records(self, records):
+        """Adds each ``(mime_type, extensions)`` pair in ``records``.
+
+        :param records: Iterable of parsed ``mime.types`` lines.
+        :returns: The number of records added.
+        """
+        count = 0
+        for (mime_type, extensions) in records:
             self.add_type(mime_type, extensions)
+            count += 1
+        return count
+
+    @contextmanager
+    def _loading(self):
+        """Wraps adding all the records of one source in a synchronous
+        load. Catalogues with transactional storage make the source atomic
+        here.
+        """
+        yield
+
+    def _begin_load(self):
+        """Called before an asynchronous load adds the records of a source.
+        Catalogues with transactional storage start a transaction here.
+        """
+
+    def _add_loaded_records(self, records):
+        """Adds ``records`` on behalf of an asynchronous load.
+
+        :param records: Iterable of parsed ``mime.types`` lines.
+        :returns: The number of records added.
+        """
+        return self._add_records(records)
+
+    def _end_load(self, succeeded):
+        """Called once an asynchronous load has added the records of a
+        source, or adding them has failed.
+
+        :param succeeded: If False, the load failed and transactional
+          storage should discard what was added since ``_begin_load``.
+        """
+
+    def _record_load(self, source, seconds, records):
+        """Remembers how long loading ``source`` took for ``report``.
+
+        :param source: Name of the loaded file.
+        :param seconds: Time spent reading, parsing and adding.
+        :param records: Number of MIME type definitions read.
+        """
+        self._load_profile.append({"source" : source,
+                                   "seconds" : seconds,
+                                   "records" : records})
+
+    def report(self, as_json = False, top = 10):
+        """Returns a report of the memory used by this catalogue, how
+        extensions and types fan out to one another, and how long each
+        source took to load since the catalogue was last cleared.
+
+        :param as_json: If True, return the report as a JSON document
+          instead of as text.
+        :param top: Number of entries to list for the largest types and
+          extensions.
+        :returns: The report as a string.
+
+        """
+        report = {"sizes" : self._report_sizes(),
+                  "entries" : {"mediatypes" : len(self.known_mediatypes),
+                               "mimetypes" : len(self.known_mimetypes),
+                               "extensions" : len(self.known_extensions)},
+                  "fanout" : self._report_fanout(top),
+                  "loads" : list(self._load_profile)}
+
+        if as_json:
+            return json.dumps(report, indent = 2, sort_keys = True)
+        return format_report(report)
+
+    def _report_sizes(self):
+        """Returns the deep size in bytes of each internal structure, and
+        their total. Objects shared between structures are counted once in
+        the total.
+        """
+        structures = {"_types_to_exts" : self._types_to_exts,
+                      "_exts_to_types" : self._exts_to_types,
+                      "_spellings_to_types" : self._spellings_to_types,
+                      "_known_mediatypes" : self._known_mediatypes,
+                      "_known_mimetypes" : self._known_mimetypes,
+                      "_known_extensions" : self._known_extensions}
+        return structure_sizes(structures)
+
+    def _report_fanout(self, top):
+        """Returns the distributions of extensions per type and types per
+        extension.
+        """
+        return {"extensions_per_type" : distribution(
+                    ((typename, len(exts)) for (typename, exts)
+                     in self._types_to_exts.items()), top),
+                "types_per_extension" : distribution(
+                    ((ext, len(types)) for (ext, types)
+                     in self._exts_to_types.items()), top)}
+
+    @classmethod
+    def aload(cls, filenames = None, filep = None, loop = None,
+              executor = None, chunk_lines = _CHUNK_LINES):
+        """Asynchronous counterpart of ``Catalogue(filenames, filep)``.
+        Files are opened, read and parsed in ``executor`` ``chunk_lines``
+        lines at a time, and each chunk is added to the catalogue from the
+        event loop, so the loop is only ever busy for one chunk at a time.
+
+        :param filenames: a filename or a list of filenames
+          containing MIMEtype definitions in the style of mime.types
+        :param filep: a file-like object to read definitions from.
+        :param loop: The asyncio event loop. Defaults to the running loop.
+        :param executor: Executor for blocking I/O. Defaults to the loop's
+          default executor.
+        :param chunk_lines: Number of lines to read per chunk.
+        :returns: A future which resolves to the loaded catalogue.
+
+        :raises: IOError (through the future) If unable to find any of the
+          files.
+
+        """
+        cat = cls.empty()
+        if filenames is None and filep is None:
+            return cat.aload_filenames(_KNOWNFILES, True, loop, executor,
+                                       chunk_lines)
+        return cat._aload_sources(filenames, filep, loop, executor,
+                                  chunk_lines)
+
+    def _aload_sources(self, filenames, filep, loop = None, executor = None,
+                       chunk_lines = _CHUNK_LINES):
+        """Asynchronous counterpart of ``_load_sources``. Loads nothing if
+        ``filenames`` and ``filep`` are both None.
+
+        :returns: A future which resolves to this catalogue.
+        """
+        if isinstance(filenames, _STRING_TYPES):
+            filenames = [filenames]
+        sources = [(None, filep)] if filep is not None else []
+        sources.extend((filename, None) for filename in filenames or [])
+        return _AsyncLoader(self, sources, False,
+                            {"loop" : loop, "executor" : executor,
+                             "chunk_lines" : chunk_lines}).start()
+
+    def aload_filenames(self, filenames, stop_on_successful_load = False,
+                        loop = None, executor = None,
+                        chunk_lines = _CHUNK_LINES):
+        """Asynchronous counterpart of ``load_filenames``. See ``aload``
+        for how the work is divided between ``executor`` and ``loop``.
+
+        As with ``load_file``, each file is added to a ``SQLiteCatalogue``
+        in a single transaction, committed once the whole file has been
+        read. Until the load completes, any other change to that catalogue
+        raises RuntimeError.
+
+        :returns: A future which resolves to this catalogue.
+
+        :raises: IOError (through the future) If None of the listed files
+          can be loaded.
+
+        """
+        sources = [(filename, None) for filename in filenames]
+        return _AsyncLoader(self, sources, stop_on_successful_load,
+                            {"loop" : loop, "executor" : executor,
+                             "chunk_lines" : chunk_lines}).start()
+
+    def aload_file(self, filep, loop = None, executor = None,
+                   chunk_lines = _CHUNK_LINES):
+        """Asynchronous counterpart of ``load_file``. See ``aload`` for how
+        the work is divided between ``executor`` and ``loop``.
+
+        :returns: A future which resolves to this catalogue.
+        """
+        return _AsyncLoader(self, [(None, filep)], False,
+                            {"loop" : loop, "executor" : executor,
+                             "chunk_lines" : chunk_lines}).start()
 
     @property
     def known_mediatypes(self):
@@ -175,6 +489,31 @@ class Catalogue(object):
         """
         return self._exts_to_types[_canonicalize_extension(extension)]
 
+    def lookup_extensions(self, typename, default = None):
+        """Like ``get_extensions``, but returns ``default`` instead of
+        raising KeyError if ``typename`` is unknown.
+
+        :param typename: String of the MIME type.
+        :param default: Value returned if the MIME type is unknown.
+        :returns: List of known extensions, or ``default``.
+
+        """
+        return self._types_to_exts.get(typename, default)
+
+    def lookup_types(self, extension, default = None):
+        """Like ``get_types``, but returns ``default`` instead of raising
+        KeyError if ``extension`` is unknown. Both the dotted and undotted
+        spellings of every known extension are indexed directly, so no
+        canonicalization is done here.
+
+        :param extension: String of the extension. This can include the
+          leading . or omit it.
+        :param default: Value returned if the extension is unknown.
+        :returns: List of known MIME types, or ``default``.
+
+        """
+        return self._spellings_to_types.get(extension, default)
+
     def add_type(self, typename, extensions):
         """Adds a new entry for ``typename`` for the given list of
         ``extensions.`` If ``typename`` is already registered, then
@@ -209,11 +548,798 @@ class Catalogue(object):
 
             if ext not in self._exts_to_types:
                 self._exts_to_types[ext] = []
+                for spelling in _spellings(ext):
+                    self._spellings_to_types[spelling] = \
+                        self._exts_to_types[ext]
             existing_types = self._exts_to_types[ext]
 
             if typename not in existing_types:
                 existing_types.append(typename)
 
+class SQLiteCatalogue(Catalogue):
+    """A Catalogue whose entries are kept in an indexed SQLite database
+    instead of in memory. This is intended for registries too large to
+    hold comfortably in the dicts and sets used by ``Catalogue``. Results
+    of ``get_types`` and ``get_extensions`` are kept in a bounded LRU
+    cache which is invalidated whenever the catalogue changes.
+
+    Ordering of the lists returned by ``get_types`` and ``get_extensions``
+    is identical to that of ``Catalogue``.
+
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS types (
+            typename TEXT PRIMARY KEY,
+            mediatype TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            typename TEXT NOT NULL,
+            extension TEXT NOT NULL,
+            UNIQUE (typename, extension)
+        );
+        CREATE INDEX IF NOT EXISTS entries_by_extension
+            ON entries (extension, seq);
+        CREATE INDEX IF NOT EXISTS types_by_mediatype
+            ON types (mediatype);
+        """
+
+    def __init__(self, database, filenames = None, filep = None,
+                 cache_size = 1024):
+        """Opens (creating if needed) the catalogue stored in ``database``
+        and then loads ``filep`` and ``filenames`` into it in the same
+        manner as ``Catalogue``.
+
+        Unlike ``Catalogue``, if ``filenames`` and ``filep`` are None then
+        no files are searched for; the existing contents of ``database``
+        are used as is.
+
+        :param database: Path of the SQLite database file, or ":memory:"
+        :param filenames: a filename or a list of filenames
+          containing MIMEtype definitions in the style of mime.types
+        :param filep: a file-like object to read definitions from.
+        :param cache_size: Maximum number of lookups kept in memory.
+
+        :raises: IOError If unable to find any of the files.
+
+        """
+        # pylint: disable=W0231
+        # Transactions are managed with savepoints, so the sqlite3 module
+        # must not begin or commit any of its own.
+        self._connection = sqlite3.connect(database, isolation_level = None)
+        self._connection.text_factory = str
+        self._connection.executescript(self._SCHEMA)
+        self._cache = _LRUCache(cache_size)
+        self._misses = _LRUCache(cache_size)
+        self._load_profile = []
+        self._savepoints = 0
+        self._async_load = False
+
+        if filenames is not None or filep is not None:
+            self._load_sources(filenames, filep)
+
+    @classmethod
+    def empty(cls, database = ":memory:", cache_size = 1024):
+        # pylint: disable=W0221
+        # Like __init__, this needs the database the catalogue is kept in.
+        """Returns a catalogue stored in ``database`` with any existing
+        contents removed.
+
+        :param database: Path of the SQLite database file, or ":memory:"
+        :param cache_size: Maximum number of lookups kept in memory.
+        :returns: An empty catalogue.
+        """
+        cat = cls(database, cache_size = cache_size)
+        cat.clear()
+        return cat
+
+    @classmethod
+    def aload(cls, database, filenames = None, filep = None, **options):
+        # pylint: disable=W0221
+        # Like __init__, this needs the database the catalogue is kept in.
+        """Asynchronous counterpart of ``SQLiteCatalogue(database,
+        filenames, filep)``. See ``Catalogue.aload`` for how the work is
+        divided between the executor and the loop.
+
+        :param database: Path of the SQLite database file, or ":memory:"
+        :param filenames: a filename or a list of filenames
+          containing MIMEtype definitions in the style of mime.types
+        :param filep: a file-like object to read definitions from.
+        :param options: ``loop``, ``executor`` and ``chunk_lines`` as for
+          ``Catalogue.aload``.
+        :returns: A future which resolves to the loaded catalogue.
+
+        :raises: IOError (through the future) If unable to find any of the
+          files.
+
+        """
+        return cls(database)._aload_sources(filenames, filep, **options)
+
+    def close(self):
+        """Closes the underlying database connection.
+        """
+        self._connection.close()
+
+    def clear(self):
+        """Clears out catalogue of known types. This removes them from the
+        database as well.
+        """
+        with self._savepoint():
+            self._connection.execute("DELETE FROM entries")
+            self._connection.execute("DELETE FROM types")
+        self._load_profile = []
+
+    def _add_records(self, records):
+        """Adds each ``(mime_type, extensions)`` pair in ``records``. All
+        of the records are inserted in a single savepoint.
+
+        :param records: Iterable of parsed ``mime.types`` lines.
+        :returns: The number of records added.
+        """
+        with self._savepoint():
+            return self._insert_records(records)
+
+    def _insert_records(self, records):
+        """Inserts ``records`` without a savepoint of their own.
+
+        :returns: The number of records inserted.
+        """
+        count = 0
+        cursor = self._connection.cursor()
+        for (mime_type, extensions) in records:
+            self._insert_type(cursor, mime_type, extensions)
+            count += 1
+        self._invalidate()
+        return count
+
+    @contextmanager
+    def _loading(self):
+        """Adds the records of a source in a savepoint of their own, so a
+        failed load leaves nothing behind, even inside another load.
+        """
+        with self._savepoint():
+            yield
+
+    @contextmanager
+    def _savepoint(self):
+        """Runs the block in a savepoint of its own. Its changes are
+        released into the enclosing savepoint, or committed if there is
+        none, and are rolled back if the block raises.
+
+        :raises: RuntimeError If an asynchronous load is in progress.
+        """
+        self._check_not_loading()
+        name = "mimecat%d" % self._savepoints
+        self._savepoints += 1
+        self._connection.execute("SAVEPOINT %s" % name)
+        try:
+            yield
+        except:
+            self._connection.execute("ROLLBACK TO %s" % name)
+            self._connection.execute("RELEASE %s" % name)
+            raise
+        else:
+            self._connection.execute("RELEASE %s" % name)
+        finally:
+            self._savepoints -= 1
+            self._invalidate()
+
+    def _check_not_loading(self):
+        """Raises RuntimeError if an asynchronous load is in progress. Its
+        savepoint stays open across turns of the event loop, so any other
+        change would be committed or rolled back along with it.
+        """
+        if self._async_load:
+            raise RuntimeError("A SQLiteCatalogue can't be changed while "
+                               "it is being loaded asynchronously.")
+
+    def _begin_load(self):
+        """Opens the savepoint holding a source loaded asynchronously.
+        Until ``_end_load``, all other changes raise RuntimeError.
+        """
+        self._check_not_loading()
+        self._connection.execute("SAVEPOINT mimecat_async")
+        self._async_load = True
+
+    def _add_loaded_records(self, records):
+        """Inserts ``records`` into the asynchronous load's savepoint.
+
+        :returns: The number of records added.
+        """
+        return self._insert_records(records)
+
+    def _end_load(self, succeeded):
+        """Commits the asynchronously loaded source, or rolls it back if
+        the load failed.
+        """
+        self._async_load = False
+        if not succeeded:
+            self._connection.execute("ROLLBACK TO mimecat_async")
+        self._connection.execute("RELEASE mimecat_async")
+        self._invalidate()
+
+    def _report_sizes(self):
+        """Returns the deep size in bytes of the in-memory caches and the
+        size of the database, and their total.
+        """
+        sizes = structure_sizes({"_cache" : self._cache,
+                                  "_misses" : self._misses})
+        (page_count,) = self._connection.execute(
+            "PRAGMA page_count").fetchone()
+        (page_size,) = self._connection.execute(
+            "PRAGMA page_size").fetchone()
+        sizes["structures"]["database"] = page_count * page_size
+        sizes["total"] += page_count * page_size
+        return sizes
+
+    def _report_fanout(self, top):
+        """Returns the distributions of extensions per type and types per
+        extension.
+        """
+        extensions_per_type = self._connection.execute(
+            "SELECT types.typename, COUNT(entries.extension) FROM types "
+            "LEFT JOIN entries ON types.typename = entries.typename "
+            "GROUP BY types.typename")
+        types_per_extension = self._connection.execute(
+            "SELECT extension, COUNT(*) FROM entries GROUP BY extension")
+        return {"extensions_per_type" : distribution(extensions_per_type,
+                                                     top),
+                "types_per_extension" : distribution(types_per_extension,
+                                                     top)}
+
+    def _distinct(self, column, table):
+        """Returns a frozenset of the distinct values of ``column``
+        """
+        cursor = self._connection.execute(
+            "SELECT DISTINCT %s FROM %s" % (column, table))
+        return frozenset(row[0] for row in cursor)
+
+    @property
+    def known_mediatypes(self):
+        """Returns the set of known media types (mediatype/subtype)
+
+        :returns: frozen set of media types
+        """
+        return self._distinct("mediatype", "types")
+
+    @property
+    def known_mimetypes(self):
+        """Returns the set of known mimetypes.
+
+        :returns: frozen set of mimetypes
+        """
+        return self._distinct("typename", "types")
+
+    @property
+    def known_extensions(self):
+        """Returns the set of known extensions.
+
+        :returns: frozen set of extensions
+        """
+        return self._distinct("extension", "entries")
+
+    def get_extensions(self, typename):
+        """Returns an ordered list of known extensions to the given MIME type.
+        See ``Catalogue.get_extensions``.
+
+        :param typename: String of the MIME type.
+        :returns: List of known extensions. These will include a leading .
+        :raises: KeyError If MIME type is unknown.
+
+        """
+        result = self.lookup_extensions(typename)
+        if result is None:
+            raise KeyError(typename)
+        return result
+
+    def get_types(self, extension):
+        """Returns an ordered list of known MIME types for the given extension.
+        See ``Catalogue.get_types``.
+
+        :param extension: String of the extension. This can include the
+          leading . or omit it.
+        :returns: List of known MIME types that use the given extension.
+        :raises: KeyError If the extension is unknown.
+
+        """
+        result = self.lookup_types(extension)
+        if result is None:
+            raise KeyError(_canonicalize_extension(extension))
+        return result
+
+    def lookup_extensions(self, typename, default = None):
+        """Like ``get_extensions``, but returns ``default`` instead of
+        raising KeyError if ``typename`` is unknown. Recent misses are
+        remembered so that repeated unknown lookups skip the database.
+
+        :param typename: String of the MIME type.
+        :param default: Value returned if the MIME type is unknown.
+        :returns: List of known extensions, or ``default``.
+
+        """
+        key = ("type", typename)
+        result = self._cached_lookup(key)
+        if result is _MISS:
+            return default
+        if result is not None:
+            return list(result)
+
+        cursor = self._connection.execute(
+            "SELECT 1 FROM types WHERE typename = ?", (typename,))
+        if cursor.fetchone() is None:
+            self._misses[key] = _MISS
+            return default
+
+        cursor = self._connection.execute(
+            "SELECT extension FROM entries WHERE typename = ? ORDER BY seq",
+            (typename,))
+        result = tuple(row[0] for row in cursor)
+        self._cache[key] = result
+        return list(result)
+
+    def lookup_types(self, extension, default = None):
+        """Like ``get_types``, but returns ``default`` instead of raising
+        KeyError if ``extension`` is unknown. Recent misses are remembered
+        so that repeated unknown lookups skip the database.
+
+        :param extension: String of the extension. This can include the
+          leading . or omit it.
+        :param default: Value returned if the extension is unknown.
+        :returns: List of known MIME types, or ``default``.
+
+        """
+        key = ("extension", extension)
+        result = self._cached_lookup(key)
+        if result is _MISS:
+            return default
+        if result is not None:
+            return list(result)
+
+        cursor = self._connection.execute(
+            "SELECT typename FROM entries WHERE extension = ? ORDER BY seq",
+            (_canonicalize_extension(extension),))
+        result = tuple(row[0] for row in cursor)
+        if not result:
+            self._misses[key] = _MISS
+            return default
+        self._cache[key] = result
+        return list(result)
+
+    def _cached_lookup(self, key):
+        """Returns the cached result for ``key``, ``_MISS`` if ``key`` is a
+        recent miss, or None if ``key`` has not been seen recently.
+        """
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        try:
+            return self._misses[key]
+        except KeyError:
+            return None
+
+    def _invalidate(self):
+        """Discards all cached lookups and misses.
+        """
+        self._cache.clear()
+        self._misses.clear()
+
+    def add_type(self, typename, extensions):
+        """Adds a new entry for ``typename`` for the given list of
+        ``extensions.`` If ``typename`` is already registered, then
+        appends list of extensions to existing entry.
+
+        :param typename: The MIME type to add.
+
+        :param extensions: String of extension or list of extensions to
+          add. This can include the leading . or omit it.
+
+        :raises: ValueError If ``typename`` is not of the format type/subtype
+
+        """
+        with self._savepoint():
+            self._insert_type(self._connection.cursor(), typename, extensions)
+
+    @staticmethod
+    def _insert_type(cursor, typename, extensions):
+        """Inserts ``typename`` and ``extensions`` using ``cursor`` without
+        committing.
+
+        :raises: ValueError If ``typename`` is not of the format type/subtype
+        """
+        (mediatype, _) = typename.split("/")
+
+        if isinstance(extensions, str):
+            extensions = [extensions]
+
+        cursor.execute("INSERT OR IGNORE INTO types VALUES (?, ?)",
+                       (typename, mediatype))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO entries (typename, extension) VALUES (?, ?)",
+            ((typename, _canonicalize_extension(ext)) for ext in extensions))
+
+class CatalogueParser(object):
+    """An incremental parser for ``mime.types`` data which is pushed to it
+    in arbitrary chunks, for example as it arrives from a decompressor or
+    a socket. Lines split across chunks are reassembled, and may end in
+    "\\n", "\\r\\n" or "\\r" as with universal newlines. Definitions are
+    added to the catalogue in batches as they are parsed, so only one batch
+    and one partial line are held at a time.
+
+    Chunks may be text or, on Python 3, UTF-8 encoded bytes. When the
+    catalogue is a ``SQLiteCatalogue``, batches added outside of a load are
+    each committed separately; use ``load_filename`` or ``load_file`` for
+    an atomic load.
+
+    """
+
+    def __init__(self, catalogue, batch_lines = _CHUNK_LINES):
+        """Creates a parser which adds definitions to ``catalogue``.
+
+        :param catalogue: The catalogue to add definitions to.
+        :param batch_lines: Number of definitions to add at a time.
+        """
+        self._catalogue = catalogue
+        self._batch_lines = batch_lines
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._partial_line = []
+        self._ends_in_cr = False
+        self._batch = []
+        self._count = 0
+
+    def feed(self, chunk):
+        """Parses ``chunk``, adding any complete batches of definitions to
+        the catalogue.
+
+        :param chunk: The next piece of ``mime.types`` data.
+        :raises: ValueError If a mimetype is invalid (not type/subtype)
+        """
+        if bytes is not str and isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+
+        self._partial_line.append(chunk)
+        if "\n" not in chunk and "\r" not in chunk and not self._ends_in_cr:
+            return
+
+        # A trailing "\r" may be the first half of "\r\n", so it is kept
+        # with the partial line until the next chunk shows which it is.
+        data = "".join(self._partial_line)
+        self._ends_in_cr = data.endswith("\r")
+        if self._ends_in_cr:
+            data = data[:-1]
+
+        lines = _split_lines(data)
+        self._partial_line = [lines.pop() + ("\r" if self._ends_in_cr else "")]
+
+        for line in lines:
+            self._parse(line)
+
+    def close(self):
+        """Parses any remaining partial line and adds the remaining
+        definitions to the catalogue.
+
+        :returns: The number of definitions parsed.
+        :raises: ValueError If a mimetype is invalid (not type/subtype)
+        """
+        if bytes is not str:
+            self._partial_line.append(self._decoder.decode(b"", True))
+
+        for line in _split_lines("".join(self._partial_line)):
+            self._parse(line)
+        self._partial_line = []
+        self._ends_in_cr = False
+        self._flush()
+        return self._count
+
+    def _parse(self, line):
+        """Parses ``line``, adding the batch to the catalogue if it is full.
+        """
+        parsed_line = _parse_line(line)
+        if parsed_line is None:
+            return
+
+        self._batch.append(parsed_line)
+        self._count += 1
+        if len(self._batch) >= self._batch_lines:
+            self._flush()
+
+    def _flush(self):
+        """Adds the current batch to the catalogue.
+        """
+        if self._batch:
+            self._catalogue._add_records(self._batch) # pylint: disable=W0212
+            self._batch = []
+
+class _LRUCache(object):
+    """A small mapping which holds at most ``maxsize`` items, discarding the
+    least recently used item when full.
+    """
+
+    def __init__(self, maxsize):
+        self._maxsize = maxsize
+        self._items = OrderedDict()
+
+    def __getitem__(self, key):
+        value = self._items.pop(key)
+        self._items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if self._maxsize <= 0:
+            return
+        self._items.pop(key, None)
+        if len(self._items) >= self._maxsize:
+            self._items.popitem(last = False)
+        self._items[key] = value
+
+    def __len__(self):
+        return len(self._items)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + deep_sizeof(self._items, set())
+
+    def clear(self):
+        """Removes all items from the cache.
+        """
+        self._items.clear()
+
+class _AsyncLoader(object):
+    """Loads a sequence of sources into a catalogue from an asyncio event
+    loop. Each source is a ``(filename, filep)`` pair where exactly one of
+    the two is not None. Blocking work runs in an executor; only adding the
+    parsed records happens on the loop.
+    """
+    # The loader is a state machine advanced by executor callbacks, so its
+    # state has to live in attributes, and it drives the load hooks which
+    # Catalogue keeps private.
+    # pylint: disable=R0902,R0903,W0212
+
+    def __init__(self, catalogue, sources, stop_on_successful_load,
+                 options):
+        """Creates a loader for ``sources``.
+
+        :param options: Dict of the ``loop``, ``executor`` and
+          ``chunk_lines`` given to ``Catalogue.aload``.
+        """
+        loop = options["loop"]
+        if loop is None:
+            if asyncio is None:
+                raise RuntimeError("asyncio is required to load "
+                                   "asynchronously.")
+            # get_running_loop is new in 3.7; get_event_loop is deprecated
+            # outside of a running loop from 3.12.
+            loop = getattr(asyncio, "get_running_loop",
+                           asyncio.get_event_loop)()
+
+        self._catalogue = catalogue
+        self._sources = list(sources)
+        self._stop_on_successful_load = stop_on_successful_load
+        self._loop = loop
+        self._executor = options["executor"]
+        self._chunk_lines = options["chunk_lines"]
+
+        self._filep = None
+        self._owns_filep = False
+        self._loading = False
+        self._source_name = None
+        self._source_start = None
+        self._source_records = 0
+        self._requires_filename = any(filename is not None
+                                      for (filename, _) in self._sources)
+        self._successful_load = False
+        self.future = loop.create_future()
+
+    def start(self):
+        """Begins loading.
+
+        :returns: A future which resolves to the catalogue.
+        """
+        self._next_source()
+        return self.future
+
+    def _run(self, func, *args):
+        """Runs ``func`` in the executor, calling back into the loader when
+        it completes.
+        """
+        return self._loop.run_in_executor(self._executor, func, *args)
+
+    def _next_source(self):
+        """Starts on the next source, or resolves the future if there are
+        none left.
+        """
+        if self.future.done():
+            return
+
+        if self._successful_load and self._stop_on_successful_load:
+            self._sources = []
+
+        if not self._sources:
+            if self._requires_filename and not self._successful_load:
+                self.future.set_exception(
+                    IOError("Could not locate a suitable mime.types file."))
+            else:
+                self.future.set_result(self._catalogue)
+            return
+
+        (filename, filep) = self._sources.pop(0)
+        self._source_name = filename or getattr(filep, "name", "<file>")
+        self._source_start = default_timer()
+        self._source_records = 0
+        if filep is not None:
+            self._start_source(filep, False)
+        else:
+            self._run(_open_text, filename).add_done_callback(self._on_open)
+
+    def _on_open(self, future):
+        """Called when a file has been opened, or failed to open.
+        """
+        try:
+            filep = future.result()
+        except IOError:
+            self._next_source()
+            return
+        except Exception as exc: # pylint: disable=W0703
+            self.future.set_exception(exc)
+            return
+
+        if self.future.done():
+            filep.close()
+            return
+
+        self._start_source(filep, True)
+
+    def _start_source(self, filep, owns_filep):
+        """Begins reading ``filep``. Its records are added between
+        ``_begin_load`` and ``_end_load`` on the catalogue, so a
+        transactional catalogue commits each source as a whole.
+        """
+        self._filep = filep
+        self._owns_filep = owns_filep
+        try:
+            self._catalogue._begin_load()
+        except Exception as exc: # pylint: disable=W0703
+            self._close(False)
+            self.future.set_exception(exc)
+            return
+        self._loading = True
+        self._read_chunk()
+
+    def _read_chunk(self):
+        """Reads and parses the next chunk of the current file.
+        """
+        self._run(_parse_chunk, self._filep,
+                  self._chunk_lines).add_done_callback(self._on_chunk)
+
+    def _on_chunk(self, future):
+        """Called with the records of a chunk, or None at the end of the
+        current file.
+        """
+        if self.future.done():
+            self._close(False)
+            return
+
+        try:
+            records = future.result()
+            if records is not None:
+                added = self._catalogue._add_loaded_records(records)
+                self._source_records += added
+        except IOError as exc:
+            # As in load_filenames, a named file which can't be read is
+            # skipped, while an error reading a given file object is not.
+            self._close(False)
+            if self._owns_filep:
+                self._next_source()
+            else:
+                self.future.set_exception(exc)
+            return
+        except Exception as exc: # pylint: disable=W0703
+            self._close(False)
+            self.future.set_exception(exc)
+            return
+
+        if records is None:
+            self._close(True)
+            self._catalogue._record_load(
+                self._source_name, default_timer() - self._source_start,
+                self._source_records)
+            if self._owns_filep:
+                self._successful_load = True
+            self._next_source()
+        else:
+            self._read_chunk()
+
+    def _close(self, succeeded):
+        """Ends the catalogue's load of the current source and closes the
+        file if it was opened by the loader.
+
+        :param succeeded: False if the source failed to load.
+        """
+        if self._loading:
+            self._loading = False
+            self._catalogue._end_load(succeeded)
+        if self._owns_filep and self._filep is not None:
+            self._filep.close()
+        self._filep = None
+
+def _parse_chunk(filep, chunk_lines):
+    """Reads and parses up to ``chunk_lines`` lines from ``filep``.
+
+    :param filep: A file-like object opened for reading
+    :param chunk_lines: Maximum number of lines to read.
+    :returns: List of parsed lines, or None if ``filep`` is exhausted.
+    """
+    lines = list(islice(filep, chunk_lines))
+    if not lines:
+        return None
+    return list(_parse_file(lines))
+
+def _read_filename(filename):
+    """Reads and parses all of ``filename``.
+
+    :param filename: The ``mime.types`` file to read.
+    :returns: Tuple of the list of lines parsed, the seconds taken to read
+      them, and the exception which stopped reading or None if the whole
+      file was read.
+    """
+    records = []
+    start = default_timer()
+    try:
+        with _open_text(filename) as filep:
+            for parsed_line in _parse_file(filep):
+                records.append(parsed_line)
+    except Exception as exc: # pylint: disable=W0703
+        return (records, default_timer() - start, exc)
+    return (records, default_timer() - start, None)
+
+def _compression(filename):
+    """Returns the compression suffix of ``filename``, or None if it is not
+    compressed.
+
+    :param filename: The filename to check.
+    :returns: One of ".gz", ".bz2", ".xz" or None.
+    """
+    for suffix in (".gz", ".bz2", ".xz"):
+        if filename.endswith(suffix):
+            return suffix
+    return None
+
+def _open_compressed(filename, text):
+    """Opens the compressed ``filename`` for reading through the matching
+    decompressor.
+
+    :param filename: A filename ending in ".gz", ".bz2" or ".xz".
+    :param text: If True, return a file of decoded lines, else of bytes.
+    :returns: A file-like object.
+    :raises: IOError If the file can't be opened, or if it is ".xz" and
+      lzma is not available.
+    """
+    suffix = _compression(filename)
+    if suffix == ".xz" and lzma is None:
+        raise IOError("lzma is required to read %s" % filename)
+
+    if suffix == ".gz":
+        filep = gzip.GzipFile(filename, "rb")
+    elif suffix == ".bz2":
+        filep = bz2.BZ2File(filename, "rb")
+    else:
+        filep = lzma.LZMAFile(filename, "rb")
+
+    # On Python 2 the decompressed lines are already str.
+    if text and bytes is not str:
+        return io.TextIOWrapper(filep, encoding = "utf-8")
+    return filep
+
+def _open_text(filename):
+    """Opens ``filename`` for reading lines, decompressing it if needed.
+
+    :param filename: The ``mime.types`` file to open.
+    :returns: A file-like object.
+    """
+    if _compression(filename) is None:
+        return open(filename, "r")
+    return _open_compressed(filename, True)
+
 def _parse_file(filep):
     """Returns a generator which yields parsed lines from a ``mime.types``
     file.
@@ -227,6 +1353,15 @@ def _parse_file(filep):
             continue
         yield parsed_line
 
+def _split_lines(data):
+    """Splits ``data`` into lines ending in "\\n", "\\r\\n" or "\\r".
+
+    :param data: The text to split.
+    :returns: List of lines without their line endings. The last item is
+      the text after the final line ending.
+    """
+    return data.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+
 def _parse_line(line):
     """Parses a line from ``mime.types``
 
@@ -253,6 +1388,20 @@ def _parse_line(line):
 
     return (mimetype, extensions)
 
+def _spellings(ext):
+    """Returns the ways a canonicalized ``ext`` may be written, namely with
+    and without the leading . The undotted spelling is left out when it
+    would itself be a canonical extension, as for "..txt", whose undotted
+    spelling is ".txt".
+
+    :param ext: A canonicalized extension.
+    :returns: Tuple of spellings of ``ext``.
+    """
+    if ext is not None and len(ext) > 1 and ext.startswith(".") \
+            and not ext.startswith(".."):
+        return (ext, ext[1:])
+    return (ext,)
+
 def _canonicalize_extension(ext):
     """Returns a transformed ext that has a uniform pattern.
     Specifically, if ``ext`` has a leading . then it is simply returned.
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""mimecat_report - Measurements and formatting used by
+``mimecat.Catalogue.report``.
+"""
+
+import sys
+
+def structure_sizes(structures):
+    """Returns the deep size of each of ``structures`` and their total.
+
+    :param structures: Dict of structure names to the structures.
+    :returns: Dict with a ``structures`` dict of names to sizes in bytes
+      and the ``total`` size in bytes.
+    """
+    seen = set()
+    total = 0
+    sizes = {}
+    for (name, structure) in structures.items():
+        sizes[name] = deep_sizeof(structure, set())
+        total += deep_sizeof(structure, seen)
+    return {"structures" : sizes, "total" : total}
+
+def deep_sizeof(obj, seen):
+    """Returns the size in bytes of ``obj`` and everything it contains,
+    skipping objects whose ids are in ``seen``.
+
+    :param obj: The object to measure.
+    :param seen: Set of ids of objects already counted. Updated in place.
+    :returns: Size in bytes.
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for (key, value) in obj.items():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    return size
+
+def distribution(counts, top):
+    """Summarizes ``counts``.
+
+    :param counts: Iterable of ``(name, count)`` pairs.
+    :param top: Number of the largest entries to list.
+    :returns: Dict with a ``histogram`` of counts to the number of names
+      with that count, and the ``largest`` ``top`` names with their counts.
+    """
+    counts = list(counts)
+    histogram = {}
+    for (_, count) in counts:
+        histogram[count] = histogram.get(count, 0) + 1
+    largest = sorted(counts, key = lambda item: (-item[1], item[0]))[:top]
+    return {"histogram" : histogram,
+            "largest" : [list(item) for item in largest]}
+
+def format_report(report):
+    """Formats the dict built by ``mimecat.Catalogue.report`` as text.
+    """
+    lines = ["Sizes (bytes):"]
+    for (name, size) in sorted(report["sizes"]["structures"].items()):
+        lines.append("  %-22s %12d" % (name, size))
+    lines.append("  %-22s %12d" % ("total", report["sizes"]["total"]))
+
+    lines.append("Entries:")
+    for (name, count) in sorted(report["entries"].items()):
+        lines.append("  %-22s %12d" % (name, count))
+
+    for (name, fanout) in sorted(report["fanout"].items()):
+        lines.append("%s:" % name.replace("_", " ").capitalize())
+        for (count, number) in sorted(fanout["histogram"].items()):
+            lines.append("  %6d: %d" % (count, number))
+        lines.append("  largest:")
+        for (entry, count) in fanout["largest"]:
+            lines.append("    %-32s %6d" % (entry, count))
+
+    lines.append("Loads:")
+    for load in report["loads"]:
+        lines.append("  %-40s %8d records %10.4fs" % (load["source"],
+                                                       load["records"],
+                                                       load["seconds"]))
+    return "\n".join(lines)
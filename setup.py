@@ -9,7 +9,7 @@ setup(name="mimecat",
       url = "https://github.com/mizhi/mimecat",
       license="MIT",
       keywords="MIME types extensions",
-      py_modules=["mimecat"],
+      py_modules=["mimecat", "mimecat_report"],
       classifiers = [
           "Development Status :: 3 - Alpha",
           "License :: OSI Approved :: MIT License",
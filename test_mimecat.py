@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
+import bz2
+import gzip
+import json
 import os
+import time
 import unittest
-from StringIO import StringIO
+import warnings
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
-from mimecat import (Catalogue, _canonicalize_extension,
-                     _parse_file, _parse_line)
+import mimecat
+from mimecat import (Catalogue, CatalogueParser, SQLiteCatalogue, _LRUCache,
+                     _canonicalize_extension, _parse_file, _parse_line)
 
 TEST_MIME_TYPES = """
 # This file maps Internet media types to unique file extension(s).
@@ -121,6 +130,52 @@ class CatalogueTests(unittest.TestCase):
         self.assertGreater(len(self.empty_catalogue._known_mimetypes), 2)
         self.assertGreater(len(self.empty_catalogue._known_extensions), 2)
 
+    def test_load_filenames_concurrently(self):
+        filenames = ["BOGUS_FILE", self.test_filename_shibboleth,
+                     self.test_filename]
+        self.empty_catalogue.load_filenames(filenames, max_workers = 3)
+
+        cat = Catalogue(self.test_filename)
+        cat.clear()
+        cat.load_filenames(filenames)
+
+        self.assertEqual(cat._types_to_exts,
+                         self.empty_catalogue._types_to_exts)
+        self.assertEqual(cat._exts_to_types,
+                         self.empty_catalogue._exts_to_types)
+        self.assertEqual(["text/plain2", "text/plain"],
+                         self.empty_catalogue.get_types("txt"))
+
+    def test_load_filenames_concurrently_parse_error(self):
+        filename_bad = "test-bad.mime.types"
+        with open(filename_bad, "w") as filep:
+            filep.write("text/b    b\ninvalid exts\ntext/c    c\n")
+
+        filenames = [self.test_filename_shibboleth, filename_bad,
+                     self.test_filename]
+        try:
+            cat = Catalogue(self.test_filename)
+            cat.clear()
+            with self.assertRaises(ValueError):
+                cat.load_filenames(filenames)
+
+            with self.assertRaises(ValueError):
+                self.empty_catalogue.load_filenames(filenames,
+                                                    max_workers = 3)
+        finally:
+            os.unlink(filename_bad)
+
+        self.assertEqual(cat._types_to_exts,
+                         self.empty_catalogue._types_to_exts)
+        self.assertIn("text/b", self.empty_catalogue.known_mimetypes)
+        self.assertNotIn("text/c", self.empty_catalogue.known_mimetypes)
+        self.assertNotIn("audio/ogg", self.empty_catalogue.known_mimetypes)
+
+    def test_load_filenames_concurrently_fail(self):
+        with self.assertRaises(IOError):
+            self.empty_catalogue.load_filenames(["BOGUS_FILE", "BOGUS_FILE2"],
+                                                max_workers = 2)
+
     def test_load_filenames_fail(self):
         with self.assertRaises(IOError):
             self.empty_catalogue.load_filenames(["BOGUS_FILE", "BOGUS_FILE2"])
@@ -215,6 +270,79 @@ class CatalogueTests(unittest.TestCase):
         with self.assertRaises(KeyError):
             self.catalogue.get_types("asdf")
 
+    def test_lookup_types(self):
+        self.assertEqual(["text/plain"], self.catalogue.lookup_types("txt"))
+        self.assertEqual(["text/plain"], self.catalogue.lookup_types(".txt"))
+        self.assertIsNone(self.catalogue.lookup_types("asdf"))
+        self.assertEqual([], self.catalogue.lookup_types("asdf", []))
+
+    def test_lookup_types_after_add_type(self):
+        self.assertIsNone(self.catalogue.lookup_types("asdf"))
+        self.catalogue.add_type("text/asdf", "asdf")
+        self.assertEqual(["text/asdf"], self.catalogue.lookup_types("asdf"))
+        self.catalogue.add_type("text/asdf2", ".asdf")
+        self.assertEqual(["text/asdf", "text/asdf2"],
+                         self.catalogue.lookup_types("asdf"))
+
+    def test_lookup_types_double_dot(self):
+        self.empty_catalogue.add_type("text/plain", ".txt")
+        self.empty_catalogue.add_type("text/weird", "..txt")
+        self.assertEqual(["text/plain"],
+                         self.empty_catalogue.lookup_types(".txt"))
+        self.assertEqual(["text/plain"],
+                         self.empty_catalogue.lookup_types("txt"))
+        self.assertEqual(["text/weird"],
+                         self.empty_catalogue.lookup_types("..txt"))
+
+        self.empty_catalogue.clear()
+        self.empty_catalogue.add_type("text/weird", "..txt")
+        self.empty_catalogue.add_type("text/plain", ".txt")
+        self.assertEqual(["text/plain"],
+                         self.empty_catalogue.lookup_types(".txt"))
+
+    def test_lookup_types_after_clear(self):
+        self.catalogue.clear()
+        self.assertIsNone(self.catalogue.lookup_types("txt"))
+
+    def test_lookup_extensions(self):
+        self.assertEqual(4, len(self.catalogue.lookup_extensions("audio/midi")))
+        self.assertIsNone(self.catalogue.lookup_extensions("bad/type"))
+        self.assertEqual([], self.catalogue.lookup_extensions("bad/type", []))
+
+    def test_empty(self):
+        cat = Catalogue.empty()
+        self.assertEqual(frozenset(), cat.known_mimetypes)
+        report = json.loads(cat.report(as_json = True))
+        self.assertEqual([], report["loads"])
+
+    def test_report(self):
+        report = self.catalogue.report()
+        self.assertIn("_types_to_exts", report)
+        self.assertIn(self.test_filename, report)
+
+    def test_report_json(self):
+        self.catalogue.load_filenames([self.test_filename_shibboleth],
+                                      max_workers = 1)
+        report = json.loads(self.catalogue.report(as_json = True, top = 1))
+
+        self.assertGreater(report["sizes"]["total"], 0)
+        self.assertEqual(len(self.catalogue.known_mimetypes),
+                         report["entries"]["mimetypes"])
+        self.assertEqual([["text/plain", 8]],
+                         report["fanout"]["extensions_per_type"]["largest"])
+        self.assertEqual(1, report["fanout"]["types_per_extension"]
+                         ["histogram"]["2"])
+        self.assertEqual([self.test_filename, self.test_filename_shibboleth],
+                         [load["source"] for load in report["loads"]])
+        self.assertEqual([13, 2],
+                         [load["records"] for load in report["loads"]])
+
+    def test_report_after_clear(self):
+        self.catalogue.clear()
+        report = json.loads(self.catalogue.report(as_json = True))
+        self.assertEqual([], report["loads"])
+        self.assertEqual(0, report["entries"]["extensions"])
+
     def test_add_type(self):
         self.empty_catalogue.add_type("text/plain", "txt")
         self.assertIn("text", self.empty_catalogue._known_mediatypes)
@@ -258,3 +386,473 @@ class CatalogueTests(unittest.TestCase):
 
         ret = _canonicalize_extension(None)
         self.assertIsNone(ret)
+
+class CatalogueParserTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_filename = "test.mime.types"
+        cls.test_filename_gz = "test.mime.types.gz"
+        cls.test_filename_bz2 = "test.mime.types.bz2"
+        with open(cls.test_filename, "w") as filep:
+            filep.write(TEST_MIME_TYPES)
+
+        data = TEST_MIME_TYPES.encode("utf-8")
+        filep = gzip.GzipFile(cls.test_filename_gz, "wb")
+        filep.write(data)
+        filep.close()
+
+        filep = bz2.BZ2File(cls.test_filename_bz2, "wb")
+        filep.write(data)
+        filep.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.test_filename)
+        os.unlink(cls.test_filename_gz)
+        os.unlink(cls.test_filename_bz2)
+
+    def setUp(self):
+        self.reference = Catalogue(self.test_filename)
+        self.catalogue = Catalogue(self.test_filename)
+        self.catalogue.clear()
+
+    def assertMatchesReference(self, cat):
+        self.assertEqual(self.reference._types_to_exts, cat._types_to_exts)
+        self.assertEqual(self.reference._exts_to_types, cat._exts_to_types)
+
+    def test_feed_chunks(self):
+        for chunk_size in (1, 7, 64, len(TEST_MIME_TYPES)):
+            self.catalogue.clear()
+            parser = CatalogueParser(self.catalogue, batch_lines = 4)
+            for i in range(0, len(TEST_MIME_TYPES), chunk_size):
+                parser.feed(TEST_MIME_TYPES[i:i + chunk_size])
+            self.assertEqual(13, parser.close())
+            self.assertMatchesReference(self.catalogue)
+
+    def test_feed_cr_and_crlf(self):
+        for newline in ("\r", "\r\n"):
+            data = TEST_MIME_TYPES.replace("\n", newline)
+            for chunk_size in (1, 2, 3, 7, len(data)):
+                self.catalogue.clear()
+                parser = CatalogueParser(self.catalogue, batch_lines = 4)
+                for i in range(0, len(data), chunk_size):
+                    parser.feed(data[i:i + chunk_size])
+                self.assertEqual(13, parser.close())
+                self.assertMatchesReference(self.catalogue)
+
+    def test_load_filename_gz_cr(self):
+        filep = gzip.GzipFile("test-cr.mime.types.gz", "wb")
+        filep.write(b"text/a a\rtext/b b\r")
+        filep.close()
+        try:
+            self.catalogue.load_filename("test-cr.mime.types.gz")
+        finally:
+            os.unlink("test-cr.mime.types.gz")
+        self.assertEqual({"text/a" : [".a"], "text/b" : [".b"]},
+                         self.catalogue._types_to_exts)
+
+    def test_feed_applies_batches(self):
+        parser = CatalogueParser(self.catalogue, batch_lines = 1)
+        parser.feed("text/plain txt\ntext/html ht")
+        self.assertIn("text/plain", self.catalogue.known_mimetypes)
+        self.assertNotIn("text/html", self.catalogue.known_mimetypes)
+
+        parser.feed("ml htm")
+        self.assertEqual(2, parser.close())
+        self.assertEqual([".html", ".htm"],
+                         self.catalogue.get_extensions("text/html"))
+
+    def test_feed_fails(self):
+        parser = CatalogueParser(self.catalogue)
+        with self.assertRaises(ValueError):
+            parser.feed("invalid exts\n")
+
+    def test_load_filename_gz(self):
+        self.catalogue.load_filename(self.test_filename_gz)
+        self.assertMatchesReference(self.catalogue)
+
+    def test_load_filename_bz2(self):
+        self.catalogue.load_filename(self.test_filename_bz2)
+        self.assertMatchesReference(self.catalogue)
+
+    def test_load_filenames_compressed_concurrently(self):
+        self.catalogue.load_filenames([self.test_filename_gz,
+                                       self.test_filename_bz2],
+                                      max_workers = 2)
+        self.assertMatchesReference(self.catalogue)
+
+    def test_load_filename_gz_sqlite_is_atomic(self):
+        data = "".join("application/x-bad%d    b%d\n" % (i, i)
+                       for i in range(1500)) + "invalid exts\n"
+        for filename in ("test-bad.mime.types", "test-bad.mime.types.gz"):
+            if filename.endswith(".gz"):
+                filep = gzip.GzipFile(filename, "wb")
+                filep.write(data.encode("utf-8"))
+                filep.close()
+            else:
+                with open(filename, "w") as filep:
+                    filep.write(data)
+
+            cat = SQLiteCatalogue(":memory:")
+            try:
+                with self.assertRaises(ValueError):
+                    cat.load_filename(filename)
+                self.assertEqual(frozenset(), cat.known_mimetypes)
+            finally:
+                cat.close()
+                os.unlink(filename)
+
+    def test_load_filename_gz_utf8(self):
+        filep = gzip.GzipFile("test-utf8.mime.types.gz", "wb")
+        filep.write(u"text/x-caf\u00e9    caf\u00e9\n".encode("utf-8"))
+        filep.close()
+        try:
+            self.catalogue.load_filename("test-utf8.mime.types.gz")
+            sequential = self.catalogue._types_to_exts
+            self.catalogue.clear()
+            self.catalogue.load_filenames(["test-utf8.mime.types.gz"],
+                                          max_workers = 1)
+            self.assertEqual(sequential, self.catalogue._types_to_exts)
+        finally:
+            os.unlink("test-utf8.mime.types.gz")
+
+    def test_load_filename_compressed_fails(self):
+        with self.assertRaises(IOError):
+            self.catalogue.load_filename("BOGUS_FILE.gz")
+
+@unittest.skipIf(mimecat.asyncio is None, "asyncio is not available")
+class AsyncLoadTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_filename = "test.mime.types"
+        cls.test_filename_large = "test-large.mime.types"
+        cls.test_filename_bad = "test-bad.mime.types"
+        with open(cls.test_filename, "w") as filep:
+            filep.write(TEST_MIME_TYPES)
+
+        with open(cls.test_filename_large, "w") as filep:
+            for i in range(200000):
+                filep.write("application/x-large%d    l%d m%d\n" % (i, i, i))
+
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.test_filename)
+        os.unlink(cls.test_filename_large)
+        if os.path.exists(cls.test_filename_bad):
+            os.unlink(cls.test_filename_bad)
+
+    def setUp(self):
+        self.loop = mimecat.asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_aload(self):
+        cat = self.loop.run_until_complete(
+            Catalogue.aload(self.test_filename, loop = self.loop))
+        reference = Catalogue(self.test_filename)
+        self.assertEqual(reference._types_to_exts, cat._types_to_exts)
+        self.assertEqual(reference._exts_to_types, cat._exts_to_types)
+
+    def test_aload_uses_running_loop(self):
+        futures = []
+        def start():
+            futures.append(Catalogue.aload(self.test_filename))
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            self.loop.call_soon(start)
+            self.loop.run_until_complete(mimecat.asyncio.sleep(0))
+            cat = self.loop.run_until_complete(futures[0])
+        self.assertIn("message/rfc822", cat.known_mimetypes)
+
+    def test_aload_with_filep(self):
+        with open(self.test_filename, "r") as filep:
+            cat = self.loop.run_until_complete(
+                Catalogue.aload(filep = filep, loop = self.loop,
+                                chunk_lines = 3))
+        self.assertIn("message/rfc822", cat._known_mimetypes)
+
+    def test_aload_records_loads(self):
+        cat = self.loop.run_until_complete(
+            Catalogue.aload(self.test_filename, loop = self.loop,
+                            chunk_lines = 5))
+        report = json.loads(cat.report(as_json = True))
+        self.assertEqual([(self.test_filename, 13)],
+                         [(load["source"], load["records"])
+                          for load in report["loads"]])
+
+    def test_aload_filenames_sqlite_is_atomic(self):
+        cat = SQLiteCatalogue(":memory:")
+        with open(self.test_filename_bad, "w") as filep:
+            for i in range(25):
+                filep.write("application/x-bad%d    b%d\n" % (i, i))
+            filep.write("invalid exts\n")
+
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(
+                cat.aload_filenames([self.test_filename,
+                                     self.test_filename_bad],
+                                    loop = self.loop, chunk_lines = 10))
+        self.assertIn("message/rfc822", cat.known_mimetypes)
+        self.assertNotIn("application/x-bad0", cat.known_mimetypes)
+        cat.close()
+
+    def test_aload_filenames_sqlite_rejects_other_changes(self):
+        cat = SQLiteCatalogue(":memory:")
+        cat.add_type("text/before", "before")
+        with open(self.test_filename_bad, "w") as filep:
+            for i in range(25):
+                filep.write("application/x-bad%d    b%d\n" % (i, i))
+            filep.write("invalid exts\n")
+
+        outcomes = []
+        def interleave():
+            try:
+                cat.add_type("text/during%d" % len(outcomes), "during")
+                outcomes.append(True)
+            except RuntimeError:
+                outcomes.append(False)
+            if not future.done():
+                self.loop.call_soon(interleave)
+
+        future = cat.aload_filenames([self.test_filename,
+                                      self.test_filename_bad],
+                                     loop = self.loop, chunk_lines = 10)
+        self.loop.call_soon(interleave)
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(future)
+
+        # Changes are rejected while a file is loading, and those accepted
+        # between files survive the failed load.
+        self.assertIn(False, outcomes)
+        for (i, accepted) in enumerate(outcomes):
+            self.assertEqual(accepted,
+                             "text/during%d" % i in cat.known_mimetypes)
+        self.assertIn("text/before", cat.known_mimetypes)
+        self.assertIn("message/rfc822", cat.known_mimetypes)
+        self.assertNotIn("application/x-bad0", cat.known_mimetypes)
+
+        cat.add_type("text/after", "after")
+        self.assertIn("text/after", cat.known_mimetypes)
+        cat.close()
+
+    def test_aload_sqlite(self):
+        with open(self.test_filename, "r") as filep:
+            cat = self.loop.run_until_complete(
+                SQLiteCatalogue.aload(":memory:", filep = filep,
+                                      loop = self.loop))
+        self.assertIsInstance(cat, SQLiteCatalogue)
+        self.assertEqual(["text/plain"], cat.get_types("txt"))
+        cat.close()
+
+        cat = self.loop.run_until_complete(
+            SQLiteCatalogue.aload(":memory:", loop = self.loop))
+        self.assertEqual(frozenset(), cat.known_mimetypes)
+        cat.close()
+
+    def test_aload_filenames_skips_unreadable(self):
+        with open("test-bogus.mime.types.gz", "w") as filep:
+            filep.write("text/x-not-gzip    ngz\n")
+
+        filenames = ["test-bogus.mime.types.gz", self.test_filename]
+        try:
+            cat = Catalogue.empty()
+            cat.load_filenames(filenames)
+            acat = Catalogue.empty()
+            self.loop.run_until_complete(
+                acat.aload_filenames(filenames, loop = self.loop))
+        finally:
+            os.unlink("test-bogus.mime.types.gz")
+
+        self.assertEqual(cat._types_to_exts, acat._types_to_exts)
+        self.assertIn("message/rfc822", acat.known_mimetypes)
+
+    def test_aload_fails(self):
+        with self.assertRaises(IOError):
+            self.loop.run_until_complete(
+                Catalogue.aload(["BOGUS_FILE"], loop = self.loop))
+
+    def test_aload_filenames_stops(self):
+        cat = Catalogue.empty()
+        self.loop.run_until_complete(
+            cat.aload_filenames(["BOGUS_FILE", self.test_filename,
+                                 self.test_filename_large],
+                                True, loop = self.loop))
+        self.assertNotIn("application/x-large0", cat._known_mimetypes)
+        self.assertIn("message/rfc822", cat._known_mimetypes)
+
+    def test_aload_does_not_block_loop(self):
+        lags = []
+        state = {"expected" : None}
+        interval = 0.005
+
+        def tick():
+            now = time.time()
+            if state["expected"] is not None:
+                lags.append(now - state["expected"])
+            state["expected"] = now + interval
+            state["handle"] = self.loop.call_later(interval, tick)
+
+        start = time.time()
+        Catalogue(self.test_filename_large)
+        blocking_time = time.time() - start
+
+        tick()
+        cat = self.loop.run_until_complete(
+            Catalogue.aload(self.test_filename_large, loop = self.loop))
+        state["handle"].cancel()
+
+        self.assertIn("application/x-large199999", cat._known_mimetypes)
+        self.assertTrue(lags)
+        self.assertLess(max(lags), blocking_time / 2)
+
+class SQLiteCatalogueTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.test_filename = "test.mime.types"
+        cls.test_database = "test.mime.sqlite"
+        with open(cls.test_filename, "w") as filep:
+            filep.write(TEST_MIME_TYPES)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.test_filename)
+
+    def setUp(self):
+        self.catalogue = SQLiteCatalogue(":memory:", self.test_filename)
+        self.reference = Catalogue(self.test_filename)
+
+    def tearDown(self):
+        self.catalogue.close()
+        if os.path.exists(self.test_database):
+            os.unlink(self.test_database)
+
+    def test_matches_catalogue(self):
+        for mimetype in self.reference.known_mimetypes:
+            self.assertEqual(self.reference.get_extensions(mimetype),
+                             self.catalogue.get_extensions(mimetype))
+        for ext in self.reference.known_extensions:
+            self.assertEqual(self.reference.get_types(ext),
+                             self.catalogue.get_types(ext))
+
+        self.assertEqual(self.reference.known_mediatypes,
+                         self.catalogue.known_mediatypes)
+        self.assertEqual(self.reference.known_mimetypes,
+                         self.catalogue.known_mimetypes)
+        self.assertEqual(self.reference.known_extensions,
+                         self.catalogue.known_extensions)
+
+    def test_get_types_fails(self):
+        with self.assertRaises(KeyError):
+            self.catalogue.get_types("asdf")
+
+    def test_get_extensions_fails(self):
+        with self.assertRaises(KeyError):
+            self.catalogue.get_extensions("bad/type")
+
+    def test_add_type_invalidates_cache(self):
+        self.assertEqual(["text/plain"], self.catalogue.get_types("txt"))
+        self.catalogue.add_type("text/plain2", ".txt")
+        self.assertEqual(["text/plain", "text/plain2"],
+                         self.catalogue.get_types("txt"))
+
+    def test_add_type_without_extensions(self):
+        self.catalogue.add_type("text/bare", [])
+        self.assertEqual([], self.catalogue.get_extensions("text/bare"))
+
+    def test_add_type_fails(self):
+        with self.assertRaises(ValueError):
+            self.catalogue.add_type("textplain", ".txt")
+
+    def test_lookup_types(self):
+        self.assertEqual(["text/plain"], self.catalogue.lookup_types("txt"))
+        self.assertEqual(["text/plain"], self.catalogue.lookup_types(".txt"))
+        self.assertIsNone(self.catalogue.lookup_types("asdf"))
+        self.assertEqual([], self.catalogue.lookup_types("asdf", []))
+
+    def test_lookup_misses_invalidated(self):
+        self.assertIsNone(self.catalogue.lookup_types("asdf"))
+        self.assertIsNone(self.catalogue.lookup_extensions("text/asdf"))
+        self.catalogue.add_type("text/asdf", "asdf")
+        self.assertEqual(["text/asdf"], self.catalogue.lookup_types("asdf"))
+        self.assertEqual([".asdf"],
+                         self.catalogue.lookup_extensions("text/asdf"))
+
+        self.catalogue.clear()
+        self.assertIsNone(self.catalogue.lookup_types("asdf"))
+
+    def test_lookup_extensions_without_extensions(self):
+        self.catalogue.add_type("text/bare", [])
+        self.assertEqual([], self.catalogue.lookup_extensions("text/bare"))
+        self.assertEqual([], self.catalogue.lookup_extensions("text/bare"))
+
+    def test_report_json(self):
+        self.catalogue.get_types("txt")
+        report = json.loads(self.catalogue.report(as_json = True))
+
+        self.assertIn("database", report["sizes"]["structures"])
+        self.assertGreater(report["sizes"]["structures"]["_cache"], 0)
+        self.assertEqual(json.loads(self.reference.report(as_json = True))
+                         ["fanout"], report["fanout"])
+        self.assertEqual([13], [load["records"] for load in report["loads"]])
+
+    def test_clear(self):
+        self.catalogue.get_types("txt")
+        self.catalogue.clear()
+        self.assertEqual(frozenset(), self.catalogue.known_mimetypes)
+        with self.assertRaises(KeyError):
+            self.catalogue.get_types("txt")
+
+    def test_load_file_is_atomic(self):
+        data = "".join("application/x-bad%d    b%d\n" % (i, i)
+                       for i in range(10)) + "invalid exts\n"
+        with self.assertRaises(ValueError):
+            self.catalogue.load_file(StringIO(data))
+        self.assertNotIn("application/x-bad0", self.catalogue.known_mimetypes)
+        self.assertIn("text/plain", self.catalogue.known_mimetypes)
+
+    def test_empty(self):
+        cat = SQLiteCatalogue.empty()
+        self.assertIsInstance(cat, SQLiteCatalogue)
+        self.assertEqual(frozenset(), cat.known_mimetypes)
+        cat.close()
+
+        cat = SQLiteCatalogue(self.test_database, self.test_filename)
+        cat.close()
+        cat = SQLiteCatalogue.empty(self.test_database)
+        self.assertEqual(frozenset(), cat.known_mimetypes)
+        cat.close()
+
+    def test_nested_load_file_failure_is_rolled_back(self):
+        with self.catalogue._loading():
+            self.catalogue.add_type("x/outer", "outer")
+            with self.assertRaises(ValueError):
+                self.catalogue.load_file(StringIO("x/a    a\ninvalid exts\n"))
+        self.assertIn("x/outer", self.catalogue.known_mimetypes)
+        self.assertNotIn("x/a", self.catalogue.known_mimetypes)
+
+        with self.assertRaises(ValueError):
+            with self.catalogue._loading():
+                self.catalogue.add_type("x/inner", "inner")
+                raise ValueError()
+        self.assertNotIn("x/inner", self.catalogue.known_mimetypes)
+
+    def test_persistence(self):
+        cat = SQLiteCatalogue(self.test_database, self.test_filename)
+        cat.close()
+
+        cat = SQLiteCatalogue(self.test_database)
+        self.assertEqual(["text/plain"], cat.get_types("txt"))
+        cat.close()
+
+    def test_lru_cache(self):
+        cache = _LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        _ = cache["a"]
+        cache["c"] = 3
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache["a"])
+        with self.assertRaises(KeyError):
+            _ = cache["b"]